@@ -1,7 +1,18 @@
 #! /usr/local/bin/python3
 
-import openpyxl
+import re
+import zipfile
+
 from openpyxl.utils import get_column_letter
+from pathlib import Path
+
+_SHEET_PART = re.compile(r'xl/worksheets/sheet\d+\.xml$')
+_COLS_ELEMENT = re.compile(r'<cols>(.*?)</cols>|<cols/>', re.S)
+_COL_ELEMENT = re.compile(r'<col\s([^>]*?)/?>')
+_ATTRIBUTE = re.compile(r'([\w:]+)="([^"]*)"')
+
+# Column widths used for the transfer statistics workbook.
+_DEFAULT_WIDTHS = (8.0, 10.0, 10.0, 10.0, 20.0, 150.0)
 
 
 def adjust_widths(wb, widths: list = None) -> None:
@@ -9,7 +20,7 @@ def adjust_widths(wb, widths: list = None) -> None:
       Default widths are the ones used for the transfer statistics workbook.
   """
   if widths is None:
-    widths = [8.0, 10.0, 10.0, 10.0, 20.0, 150.0]
+    widths = _DEFAULT_WIDTHS
 
   for sheet in wb.worksheets:
     for col, width in enumerate(widths, 1):
@@ -17,7 +28,65 @@ def adjust_widths(wb, widths: list = None) -> None:
   return
 
 
+def _merge_cols(cols_xml: str, widths) -> str:
+  """ Return a <cols> element with the widths of the first len(widths) columns set, and every
+      other column, and every other attribute of the set ones, as it was in cols_xml.
+  """
+  # Each <col> covers the range of columns from min to max.
+  ranges = []
+  for col_match in _COL_ELEMENT.finditer(cols_xml):
+    attributes = dict(_ATTRIBUTE.findall(col_match.group(1)))
+    ranges.append([int(attributes.pop('min')), int(attributes.pop('max')), attributes])
+
+  for col, width in enumerate(widths, 1):
+    for index, (first, last, attributes) in enumerate(ranges):
+      if first <= col <= last:
+        # Split the range around col so only col gets the new width.
+        target = dict(attributes)
+        pieces = [[first, col - 1, attributes],
+                  [col, col, target],
+                  [col + 1, last, dict(attributes)]]
+        ranges[index:index + 1] = [piece for piece in pieces if piece[0] <= piece[1]]
+        break
+    else:
+      target = {}
+      ranges.append([col, col, target])
+    target['width'] = str(width)
+    target['customWidth'] = '1'
+
+  ranges.sort(key=lambda col_range: col_range[0])
+  col_elements = []
+  for first, last, attributes in ranges:
+    attribute_str = ''.join(f' {name}="{value}"' for name, value in attributes.items())
+    col_elements.append(f'<col min="{first}" max="{last}"{attribute_str}/>')
+  return f'<cols>{"".join(col_elements)}</cols>'
+
+
+def adjust_file_widths(path, widths: list = None) -> None:
+  """ Like adjust_widths(), but for a saved xlsx file: only the listed columns change. Column
+      widths live only in the <cols> element of each worksheet's XML part, so just that element is
+      rewritten, and the workbook is never parsed by openpyxl.
+  """
+  if widths is None:
+    widths = _DEFAULT_WIDTHS
+
+  path = Path(path)
+  tmp_path = path.with_suffix('.tmp')
+  with zipfile.ZipFile(path) as src, zipfile.ZipFile(tmp_path, 'w') as dst:
+    for item in src.infolist():
+      data = src.read(item)
+      if _SHEET_PART.match(item.filename):
+        xml = data.decode('utf-8')
+        if cols_match := _COLS_ELEMENT.search(xml):
+          cols = _merge_cols(cols_match.group(1) or '', widths)
+          xml = f'{xml[:cols_match.start()]}{cols}{xml[cols_match.end():]}'
+        else:
+          # <cols> has to come immediately before <sheetData> in a worksheet.
+          xml = xml.replace('<sheetData', f'{_merge_cols("", widths)}<sheetData', 1)
+        data = xml.encode('utf-8')
+      dst.writestr(item, data)
+  tmp_path.replace(path)
+
+
 if __name__ == '__main__':
-  wb = openpyxl.open('reports/transfer_statistics.xlsx')
-  adjust_widths(wb)
-  wb.save('reports/transfer_statistics.xlsx')
+  adjust_file_widths('reports/transfer_statistics.xlsx')
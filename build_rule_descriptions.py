@@ -24,13 +24,36 @@
 import psycopg
 import time
 
-from collections import namedtuple, defaultdict
+from collections import namedtuple
 from datetime import datetime
+from functools import lru_cache
 from psycopg.rows import namedtuple_row
 
 
+# Convert GPA values to letter grades by table lookup.
+# int(round(3×GPA)) gives the index into the letters table.
+# Index positions 0 and 1 aren't actually used.
+"""
+        GPA  3×GPA  Index  Letter
+        4.3   12.9     13      A+
+        4.0   12.0     12      A
+        3.7   11.1     11      A-
+        3.3    9.9     10      B+
+        3.0    9.0      9      B
+        2.7    8.1      8      B-
+        2.3    6.9      7      C+
+        2.0    6.0      6      C
+        1.7    5.1      5      C-
+        1.3    3.9      4      D+
+        1.0    3.0      3      D
+        0.7    2.1      2      D-
+"""
+_LETTERS = ('F', 'F', 'D-', 'D', 'D+', 'C-', 'C', 'C+', 'B-', 'B', 'B+', 'A-', 'A', 'A+')
+
+
 # _grade()
 # -------------------------------------------------------------------------------------------------
+@lru_cache(maxsize=None)
 def _grade(min_gpa, max_gpa):
   """ Convert numerical gpa range to description of required grade in letter-grade form.
       The issue is that gpa values are not represented uniformly across campuses, and the strings
@@ -38,26 +61,6 @@ def _grade(min_gpa, max_gpa):
       names.
   """
 
-  # Convert GPA values to letter grades by table lookup.
-  # int(round(3×GPA)) gives the index into the letters table.
-  # Index positions 0 and 1 aren't actually used.
-  """
-          GPA  3×GPA  Index  Letter
-          4.3   12.9     13      A+
-          4.0   12.0     12      A
-          3.7   11.1     11      A-
-          3.3    9.9     10      B+
-          3.0    9.0      9      B
-          2.7    8.1      8      B-
-          2.3    6.9      7      C+
-          2.0    6.0      6      C
-          1.7    5.1      5      C-
-          1.3    3.9      4      D+
-          1.0    3.0      3      D
-          0.7    2.1      2      D-
-    """
-  letters = ['F', 'F', 'D-', 'D', 'D+', 'C-', 'C', 'C+', 'B-', 'B', 'B+', 'A-', 'A', 'A+']
-
   assert min_gpa <= max_gpa, f'{min_gpa=} greater than {max_gpa=}'
 
   # Put gpa values into “canonical form” to deal with creative values found in CUNYfirst.
@@ -76,14 +79,14 @@ def _grade(min_gpa, max_gpa):
     return 'any passing grade'
 
   if min_gpa >= 0.7 and max_gpa >= 3.7:
-    letter = letters[int(round(min_gpa * 3))]
+    letter = _LETTERS[int(round(min_gpa * 3))]
     return f'{letter} or above'
 
   if min_gpa > 0.7 and max_gpa < 3.7:
-    return f'between {letters[int(round(min_gpa * 3))]} and {letters[int(round(max_gpa * 3))]}'
+    return f'between {_LETTERS[int(round(min_gpa * 3))]} and {_LETTERS[int(round(max_gpa * 3))]}'
 
   if max_gpa < 3.7:
-    letter = letters[int(round(max_gpa * 3))]
+    letter = _LETTERS[int(round(max_gpa * 3))]
     return 'below ' + letter
 
   return 'any passing grade'
@@ -114,136 +117,152 @@ def and_list(items):
       return ', '.join(items[0:-1]) + f', and {items[-1]}'
 
 
+Alias = namedtuple('Alias', """ course_id
+                                offer_nbr
+                                institution
+                                discipline
+                                catalog_number
+                                cat_num cuny_subject
+                                min_credits
+                                max_credits
+                                course_status
+                                is_mesg
+                                is_bkcr
+                            """)
+# Positions of the only two alias fields used, so rows needn't be converted to Alias namedtuples.
+_ALIAS_DISCIPLINE = Alias._fields.index('discipline')
+_ALIAS_CATALOG_NUMBER = Alias._fields.index('catalog_number')
+
+
+# format_sending_side()
+# -------------------------------------------------------------------------------------------------
+def format_sending_side(sources: list) -> str:
+  """ Format the sending side of a rule, given its source_courses rows
+      as a json_agg list in cat_num order.
+  """
+  source_list = []
+  sending_credits = 0.0
+  for source in sources:
+    sending_credits += source['max_credits']
+    alias_list = [f'{alias[_ALIAS_DISCIPLINE]} {alias[_ALIAS_CATALOG_NUMBER]}'
+                  for alias in source['aliases']]
+    grade_str = _grade(source['min_gpa'], source['max_gpa'])
+    course_str = (f'{source["discipline"]} {source["catalog_number"]} '
+                  f'({source["max_credits"]:0.1f} cr)')
+    if len(alias_list) > 0:
+      alias_str = and_list(alias_list)
+      suffix = '' if len(alias_list) == 1 else 'es'
+      alias_clause = f' (alias{suffix}: {alias_str})'
+    else:
+      alias_clause = ''
+
+    source_list.append(f'{grade_str} in {course_str}{alias_clause}')
+
+  total_credit_str = f' ({sending_credits:0.1f} cr)' if len(source_list) > 1 else ''
+  return f'{" and ".join(source_list)}{total_credit_str} transfers as '
+
+
+# format_receiving_side()
+# -------------------------------------------------------------------------------------------------
+def format_receiving_side(dests: list) -> str:
+  """ Format the receiving side of a rule, given its destination_courses
+      rows as a json_agg list in cat_num order.
+  """
+  dest_list = []
+  for dest in dests:
+    if dest['is_mesg'] or dest['is_bkcr'] or dest['course_status'] != 'A':
+      admins = []
+      if dest['is_mesg']:
+        admins.append('M')
+      if dest['is_bkcr']:
+        admins.append('B')
+      if dest['course_status'] != 'A':
+        assert dest['course_status'] == 'I', f"{dest['course_status']} is neither A nor I"
+        admins.append('I')
+      credit_str = f' ({"".join(admins)})'
+    elif dest['transfer_credits'] == 99:
+      credit_str = '(*)'
+    else:
+      credit_str = f' ({dest["transfer_credits"]:0.1f} cr)'
+    dest_list.append(f'{dest["discipline"]} {dest["catalog_number"]}{credit_str}')
+  return ' and '.join(dest_list)
+
+
 # main()
 # -------------------------------------------------------------------------------------------------
 if __name__ == "__main__":
-  Alias = namedtuple('Alias', """ course_id
-                                  offer_nbr
-                                  institution
-                                  discipline
-                                  catalog_number
-                                  cat_num cuny_subject
-                                  min_credits
-                                  max_credits
-                                  course_status
-                                  is_mesg
-                                  is_bkcr
-                              """)
   session_start = time.time()
-  with psycopg.connect('dbname=cuny_curriculum') as conn:
-    with conn.cursor(row_factory=namedtuple_row) as cursor:
-
-      # Create namedtuples for the columns in the source and destination course lists
-      cursor.execute("""
-      select column_name
-      from information_schema.columns
-      where table_name = 'source_courses'
-      """)
-
-      cursor.execute("""
-      select column_name
-      from information_schema.columns
-      where table_name = 'destination_courses'
-      """)
-
-      print('Lookup Sending Side')
-      lookup_start = time.time()
-      rules = defaultdict(str)
+  # Rules are read through a server-side cursor on conn while their descriptions are written by
+  # COPY on copy_conn: a connection can't run a COPY while one of its named cursors is being
+  # fetched from. The COPY goes into a staging table, which replaces rule_descriptions only at the
+  # end, so readers of rule_descriptions aren't locked out for the whole build.
+  with (psycopg.connect('dbname=cuny_curriculum') as conn,
+        psycopg.connect('dbname=cuny_curriculum') as copy_conn):
+    with copy_conn.cursor() as cursor:
       cursor.execute("""
-      select r.rule_key, json_agg(s.*) as src
-      from transfer_rules r, source_courses s
-      where s.rule_id = r.id
-      group by rule_key
-      """)
+        drop table if exists rule_descriptions_new;
+        create table rule_descriptions_new (
+        rule_key text primary key,
+        description text)
+        """)
 
-      print(f'{cursor.rowcount:,} Rules {elapsed(lookup_start)}')
-      print('Format Sending Side')
-      format_start = time.time()
-      for rule in cursor:
-
-        print(f'\r {cursor.rownumber:,}', end='')
-
-        # Sending side
-        sources = rule.src
-        source_list = []
-        sending_credits = 0.0
-        for source in sorted(sources, key=lambda val: val['cat_num']):
-          sending_credits += source['max_credits']
-          alias_list = []
-          for alias in source['aliases']:
-            # Create namedtuple so we can access the needed fields by name
-            alias_values = Alias._make(alias)
-            alias_list.append(f'{alias_values.discipline} {alias_values.catalog_number}')
-          source['aliases'] = alias_list
-          grade_str = _grade(source['min_gpa'], source['max_gpa'])
-          course_str = (f'{source["discipline"]} {source["catalog_number"]} '
-                        f'({source["max_credits"]:0.1f} cr)')
-          if len(alias_list) > 0:
-            alias_str = and_list(alias_list)
-            suffix = '' if len(alias_list) == 1 else 'es'
-            alias_clause = f' (alias{suffix}: {alias_str})'
-          else:
-            alias_clause = ''
-
-          source_list.append(f'{grade_str} in {course_str}{alias_clause}')
-
-        total_credit_str = f' ({sending_credits:0.1f} cr)' if len(source_list) > 1 else ''
-        rule_str = f'{" and ".join(source_list)}{total_credit_str} transfers as '
-        rules[rule.rule_key] = rule_str
-      print(f'{len(rules):,} Rules {elapsed(format_start)}')
-
-      # Gather receiving side
-      print('Lookup Receiving Side')
+      print('Lookup Rules')
       lookup_start = time.time()
-      cursor.execute("""
-      select r.rule_key, json_agg(d.*) as dst
-      from transfer_rules r, destination_courses d
-      where d.rule_id = r.id
-      group by rule_key
-      """)
-      print(f'\n{cursor.rowcount:,} Rules {elapsed(lookup_start)}')
-      print('Format Receiving Side')
-      format_start = time.time()
-      for rule in cursor:
-        print(f'\r {cursor.rownumber:,}', end='')
-        dests = rule.dst
-        dest_list = []
-        dest_credits = 0.0
-        for dest in sorted(dests, key=lambda val: val['cat_num']):
-          if dest['is_mesg'] or dest['is_bkcr'] or dest['course_status'] != 'A':
-            admins = []
-            if dest['is_mesg']:
-              admins.append('M')
-            if dest['is_bkcr']:
-              admins.append('B')
-            if dest['course_status'] != 'A':
-              assert dest['course_status'] == 'I', f"{dest['course_status']} is neither A nor I"
-              admins.append('I')
-            credit_str = f' ({"".join(admins)})'
-          elif dest['transfer_credits'] == 99:
-            credit_str = '(*)'
-          else:
-            credit_str = f' ({dest["transfer_credits"]:0.1f} cr)'
-          dest_list.append(f'{dest["discipline"]} {dest["catalog_number"]}{credit_str}')
-        rules[rule.rule_key] += ' and '.join(dest_list)
-
-      print(f'\nFormating Complete {elapsed(format_start)}')
-      print('Generate rule_descriptions table')
-      generate_start = time.time()
+      # Server-side cursor, so the rules and their course lists arrive itersize rows at a time
+      # rather than all being buffered client-side before formatting starts.
+      with conn.cursor('rules', row_factory=namedtuple_row) as rule_cursor:
+        rule_cursor.itersize = 2000
+        rule_cursor.execute("""
+        with src as (select rule_id,
+                            json_agg(json_build_object('discipline', s.discipline,
+                                                       'catalog_number', s.catalog_number,
+                                                       'max_credits', s.max_credits,
+                                                       'min_gpa', s.min_gpa,
+                                                       'max_gpa', s.max_gpa,
+                                                       'aliases', s.aliases)
+                                     order by s.cat_num) as courses
+                       from source_courses s
+                      group by rule_id),
+             dst as (select rule_id,
+                            json_agg(json_build_object('discipline', d.discipline,
+                                                       'catalog_number', d.catalog_number,
+                                                       'transfer_credits', d.transfer_credits,
+                                                       'course_status', d.course_status,
+                                                       'is_mesg', d.is_mesg,
+                                                       'is_bkcr', d.is_bkcr)
+                                     order by d.cat_num) as courses
+                       from destination_courses d
+                      group by rule_id)
+        select r.rule_key, src.courses as src, dst.courses as dst
+          from transfer_rules r
+               left join src on src.rule_id = r.id
+               left join dst on dst.rule_id = r.id
+         where src.rule_id is not null or dst.rule_id is not null
+        """)
+        print(f'Lookup Complete {elapsed(lookup_start)}')
+
+        print('Format and Copy Rules')
+        format_start = time.time()
+        with cursor.copy("copy rule_descriptions_new (rule_key, description) from stdin") as copy:
+          for rule in rule_cursor:
+            if rule_cursor.rownumber % 1000 == 0:
+              print(f'\r {rule_cursor.rownumber:,}', end='')
+            sending_side = format_sending_side(rule.src) if rule.src else ''
+            receiving_side = format_receiving_side(rule.dst) if rule.dst else ''
+            description = sending_side + receiving_side
+            copy.write_row((rule.rule_key, f'{description[0].upper()}{description[1:]}'))
+        num_rules = rule_cursor.rownumber
+
+      print(f'\n{num_rules:,} Rules')
+      print(f'Format and Copy Complete {elapsed(format_start)}')
       cursor.execute("""
         drop table if exists rule_descriptions;
-        create table rule_descriptions (
-        rule_key text primary key,
-        description text)
+        alter table rule_descriptions_new rename to rule_descriptions;
+        alter index rule_descriptions_new_pkey rename to rule_descriptions_pkey
         """)
-
-      with cursor.copy("copy rule_descriptions (rule_key, description) from stdin") as descriptions:
-        for k, v in rules.items():
-          descriptions.write_row((k, f'{v[0].upper()+v[1:]}'))
       cursor.execute(f"""
       update updates
          set update_date = '{datetime.today().isoformat()[0:10]}'
        where table_name = 'rule_descriptions'
       """)
-      print('Generate Complete', elapsed(generate_start))
   exit(elapsed(session_start))
@@ -2,8 +2,6 @@
 """ Query the transfer rules to count number of rules where the receiving side is all BKCR.
 """
 
-from collections import Counter
-
 import psycopg
 from psycopg.rows import namedtuple_row
 
@@ -11,54 +9,40 @@ colleges = ['BAR', 'BCC', 'BKL', 'BMC', 'CSI', 'CTY', 'HOS', 'HTR', 'JJC', 'KCC'
             'LAG', 'LEH', 'MEC', 'NCC', 'NYT', 'QCC', 'QNS', 'SLU', 'SPS', 'YRK']
 ignore = ['GRD', 'LAW', 'SPH']
 
-all_bkcr = {}
-totals = {}
-
-# Initialize counters
-for src in colleges:
-  all_bkcr[src] = Counter(colleges)
-  totals[src] = Counter(colleges)
-  for dst in colleges:
-    all_bkcr[src][dst] = 0
-    totals[src][dst] = 0
+# Counters, indexed by [src][dst]
+all_bkcr = {src: dict.fromkeys(colleges, 0) for src in colleges}
+totals = {src: dict.fromkeys(colleges, 0) for src in colleges}
 
 if __name__ == '__main__':
   with psycopg.connect('dbname=cuny_curriculum') as conn:
-    count_cursor = conn.cursor(row_factory=namedtuple_row)
     with conn.cursor(row_factory=namedtuple_row) as rule_cursor:
+      # Let the db decide which rules are all-bkcr and tally them by college pair, so only one row
+      # per (src, dst) comes back instead of one row per rule.
       rule_cursor.execute("""
-      select r.id, r.source_institution, r.destination_institution,
-             string_agg(d.is_mesg::text, ' ') as mesg,
-             string_agg(d.is_bkcr::text, ' ') as bkcr
-        from transfer_rules r, destination_courses d
+      select substr(r.source_institution, 1, 3) as src,
+             substr(r.destination_institution, 1, 3) as dst,
+             count(*) as total,
+             count(*) filter (where d.all_bkcr) as all_bkcr
+        from transfer_rules r,
+             (select rule_id, bool_and(is_bkcr) as all_bkcr
+                from destination_courses
+               group by rule_id) d
        where d.rule_id = r.id
-       group by r.id, r.source_institution, r.destination_institution
+       group by src, dst
       """)
-      num_rules = rule_cursor.rowcount
-      for rule in rule_cursor.fetchall():
-        rule_id = int(rule.id)
-        src, dst = rule.source_institution[0:3], rule.destination_institution[0:3]
-        if src in ignore or dst in ignore:
+      for row in rule_cursor:
+        if row.src in ignore or row.dst in ignore:
           continue
-        totals[src][dst] += 1
-        if 'false' not in rule.bkcr:
-          all_bkcr[src][dst] += 1
+        totals[row.src][row.dst] = row.total
+        all_bkcr[row.src][row.dst] = row.all_bkcr
 
       print('    SRC\\DST', ''.join([f'{c:>7}' for c in colleges]))
-      for src in sorted(totals.keys()):
-        # print('       ', ''.join([f'{k:>7}' for k in sorted(totals[src].keys())]))
-        print(f'{src:>11} ', end='')
-        for dst in sorted(totals[src].keys()):
-          print(f'{totals[src][dst]:>7}', end='')
-        print('\n # all_bkcr ', end='')
-        for dst in sorted(all_bkcr[src].keys()):
-          print(f'{all_bkcr[src][dst]:>7}', end='')
-        print('\n % all_bkcr ', end='')
-        for dst in sorted(all_bkcr[src].keys()):
-          try:
-            print(f'{100 * (all_bkcr[src][dst] / totals[src][dst]):>7.1f}', end='')
-          except ZeroDivisionError:
-            print('     --', end='')
-        print()
+      for src in colleges:
+        src_totals, src_all_bkcr = totals[src], all_bkcr[src]
+        percents = [f'{100 * (src_all_bkcr[dst] / src_totals[dst]):>7.1f}' if src_totals[dst]
+                    else '     --' for dst in colleges]
+        print(f'{src:>11} ' + ''.join([f'{src_totals[dst]:>7}' for dst in colleges]))
+        print(' # all_bkcr ' + ''.join([f'{src_all_bkcr[dst]:>7}' for dst in colleges]))
+        print(' % all_bkcr ' + ''.join(percents))
       exit()
 
@@ -8,7 +8,10 @@ from psycopg.rows import namedtuple_row
 
 if __name__ == '__main__':
   with psycopg.connect(dbname='cuny_transfers') as conn:
-    with conn.cursor(row_factory=namedtuple_row) as cursor:
+    # Server-side cursor: there is a row for every student-course-college combination, so stream
+    # them in batches rather than buffering them all client-side.
+    with conn.cursor('transfer_counts', row_factory=namedtuple_row) as cursor:
+      cursor.itersize = 10000
       # A course might appear to be transferred multiple times by the same student because of
       # re-evaluations, so that has to be accounted for.
       query = """
@@ -20,7 +23,7 @@ if __name__ == '__main__':
       cursor.execute(query)
       # Write results as a CSV file to stdout.
       print('To,From,Course,Count')
-      for row in cursor.fetchall():
+      for row in cursor:
         if int(row.count) > 5:
           print(f'{row.dst_institution[0:3]},{row.src_institution[0:3]},{row.src_course_id:06}:'
                 f'{row.src_offer_nbr},{row.count:6,}')
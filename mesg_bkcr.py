@@ -22,7 +22,7 @@ if __name__ == '__main__':
       group by min_is_zero, max_is_zero, rollup(credit_source, c.designation)
       order by credit_source, c.designation, min_is_zero, max_is_zero
       """)
-      for row in cursor.fetchall():
+      for row in cursor:
         try:
           min_is_zero = 'FT'[row.min_is_zero]
         except TypeError:
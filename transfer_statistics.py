@@ -19,27 +19,32 @@ spreadsheet per receiving college.
 Dictionaries
   src_courses
     Keys    [dst_institution][(src_course_id, src_offer_nbr)]
-    Values  SrcCourse(src_institution, course_str, transfer_rules)
+    Values  SrcCourse(src_institution, course_str, rules)
+            rules are (rule_description, rule_key) pairs
   rule_descriptions
     Key     rule_key
     Value   Natural language text
   metadata
     Key     (course_id, offer_nbr)
-    Values  Metadata(course_str, is_undergraduate, is_active, is_mesg, is_bkcr, is_unknown)
-            .flags_str is textual representation of the five booleans
+    Values  Metadata(institution, course_str, is_ugrad, is_active, is_mesg, is_bkcr, is_unknown)
+            .flags() is textual representation of the five booleans
 
 """
 
 import csv
+import hashlib
 import os
+import pickle
 import psycopg
 import time
 
 from adjustcolwidths import adjust_widths
 
 from collections import defaultdict, namedtuple
+from dataclasses import dataclass
 from datetime import datetime
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import NamedStyle, Alignment, Font
 from pathlib import Path
 from psycopg.rows import namedtuple_row
@@ -47,6 +52,15 @@ from recordclass import recordclass
 
 DEBUG = os.getenv('DEBUG_TRANSFER_STATISTICS')
 
+# Shared stand-in for the src_courses of a college with no bkcr rules.
+_NO_COURSES = {}
+
+# Part of the curriculum cache digest: bump it whenever SrcCourse, Metadata, or the queries that
+# fill src_courses and metadata change, so pickles with the old layout are not reused.
+_CACHE_VERSION = 1
+_CACHE_TABLES = ['cuny_courses', 'destination_courses', 'rule_descriptions', 'source_courses',
+                 'transfer_rules']
+
 
 # elapsed()
 # -------------------------------------------------------------------------------------------------
@@ -57,6 +71,37 @@ def elapsed(since: float):
   return f'{h:02}:{m:02}:{s:02}'
 
 
+# class Metadata
+# -------------------------------------------------------------------------------------------------
+@dataclass(slots=True, frozen=True)
+class Metadata:
+  """Catalog information about a course."""
+  institution: str
+  course_str: str
+  is_ugrad: bool
+  is_active: bool
+  is_mesg: bool
+  is_bkcr: bool
+  is_unknown: bool
+
+  def flags(self) -> str:
+    """ String giving status of “interesting” settings of the Metadata boolean values.
+        Undergraduate-active-real courses will return the empty string.
+    """
+    return_str = ''
+    if not self.is_ugrad:
+      return_str += 'G'
+    if not self.is_active:
+      return_str += 'I'
+    if self.is_mesg:
+      return_str += 'M'
+    if self.is_bkcr:
+      return_str += 'B'
+    if self.is_unknown:
+      return_str += '?'
+    return return_str
+
+
 if __name__ == '__main__':
 
   session_start = time.time()
@@ -64,17 +109,11 @@ if __name__ == '__main__':
   report_file = open(f'./reports/{datetime.today().isoformat()[0:10]}_report.txt', 'w')
 
   # Check CUNYfirst data is current
-  latest_query = None
-  query_files = Path('./downloads/').glob('CV_QNS_XFER_STATS*csv')
-  for query_file in query_files:
-    if latest_query is None:
-      latest_query = query_file
-      latest_timestamp = query_file.stat().st_mtime
-    else:
-      this_timestamp = query_file.stat().st_mtime
-      if this_timestamp > latest_timestamp:
-        latest_query = query_file
-        latest_timestamp = this_timestamp
+  latest_query = max(Path('./downloads/').glob('CV_QNS_XFER_STATS*csv'),
+                     key=lambda query_file: query_file.stat().st_mtime, default=None)
+  if latest_query is None:
+    exit('No CUNYfirst query (CV_QNS_XFER_STATS*csv) in ./downloads/')
+  latest_timestamp = latest_query.stat().st_mtime
   file_date = f'{time.strftime("%Y-%m-%d", time.localtime(latest_timestamp))}'
   file_age = (datetime.today() - datetime.fromisoformat(file_date)).days
   if file_age > 7:
@@ -85,7 +124,8 @@ if __name__ == '__main__':
   # Initialize From Curriculum Database
   # ===============================================================================================
 
-  # A SrcCourse is one that has one or more xfer rules that awards bkcr
+  # A SrcCourse is one that has one or more xfer rules that awards bkcr. Its rules are
+  # (description, rule_key) pairs, looked up once here rather than for each transfer.
   SrcCourse = namedtuple('SrcCourse', 'src_institution, course_str, rules')
   src_courses = defaultdict(dict)  # Index by [dst_institution][src_course_id, src_offer_nbr]
 
@@ -101,92 +141,117 @@ if __name__ == '__main__':
       s = '' if days == 1 else 's'
       print(f'Rule descriptions were updated {days} day{s} ago.')
 
-      print('Collect Transfer Rules')
-
+      # The curriculum info below changes only when the tables it comes from do, so it is cached
+      # in a pickle named by a digest of their state and reused until one changes. update_date
+      # holds only a day, so the digest also covers each table's oid (new when a table is
+      # recreated) and its insert/update/delete counters (which any other write advances).
       cursor.execute("""
-      select src.course_id, src.offer_nbr, src.discipline, src.catalog_number,
-             rules.source_institution,
-             rules.destination_institution,
-             string_agg(rule_key, ' ') as rules
-      from source_courses src, transfer_rules rules, destination_courses dst
-      where (src.course_id, src.offer_nbr, rules.destination_institution) in
-            (select s.course_id, s.offer_nbr, r.destination_institution
-               from source_courses s, transfer_rules r, destination_courses d
-               where s.rule_id = r.id
-                 and d.rule_id = r.id
-                 and (d.is_bkcr or d.is_mesg)
-               group by s.course_id, s.offer_nbr, r.destination_institution)
-        and src.rule_id = rules.id
-        and dst.rule_id = rules.id
-      group by src.course_id, src.offer_nbr, src.discipline, src.catalog_number,
-               rules.source_institution, rules.destination_institution
-      """)
-
-      for row in cursor:
-        course_str = f'{row.discipline.strip()} {row.catalog_number.strip()}'
-        src_key = (row.course_id, row.offer_nbr)
-        dest = row.destination_institution
-        src_courses[dest][src_key] = SrcCourse._make([row.source_institution,
-                                                      course_str,
-                                                      row.rules.split()])
-      print(f'  {cursor.rowcount:10,} Sending Courses\t{elapsed(session_start)}')
-
-      # Cache all rule decriptions, previously stored in the cuny_curriculum db.
-      rule_descriptions = defaultdict(str)
-      cursor.execute("""
-      select rule_key, description
-      from rule_descriptions
-      """)
-      for row in cursor:
-        rule_descriptions[row.rule_key] = row.description
-      print(f'  {len(rule_descriptions):10,} Rule Descriptions\t{elapsed(session_start)}')
-
-      # Cache metadata for all cuny courses, and credits for real courses. Note: this info is
-      # used only for receiving courses.
-      meta_start = time.time()
-      Metadata = namedtuple('Metadata', 'institution course_str '
-                                        'is_ugrad is_active is_mesg is_bkcr is_unknown')
-
-      def _flags_str(self):
-        """ String giving status of “interesting” settings of the Metadata boolean values.
-            Undergraduate-active-real courses will return the empty string.
-        """
-        return_str = ''
-        if not self.is_ugrad:
-          return_str += 'G'
-        if not self.is_active:
-          return_str += 'I'
-        if self.is_mesg:
-          return_str += 'M'
-        if self.is_bkcr:
-          return_str += 'B'
-        if self.is_unknown:
-          return_str += '?'
-        return return_str
-      setattr(Metadata, 'flags', _flags_str)
-
-      metadata = dict()  # Index by (course_id, offer_nbr)
-      real_credit_courses = set()  # Members are (course_id, offer_nbr)
-
-      cursor.execute("""
-      select course_id, offer_nbr, institution, discipline, catalog_number,
-             career ~* '^U' as is_ugrad,
-             course_status = 'A' as is_active,
-             designation in ('MNL', 'MLA') as is_mesg,
-             attributes ~* 'bkcr' as is_bkcr
-      from cuny_courses
-      """)
-      for row in cursor:
-        course_str = f'{row.discipline.strip()} {row.catalog_number.strip()}'
-        metadata[(row.course_id, row.offer_nbr)] = Metadata._make([row.institution,
-                                                                   course_str,
-                                                                   row.is_ugrad,
-                                                                   row.is_active,
-                                                                   row.is_mesg,
-                                                                   row.is_bkcr,
-                                                                   False])
-        if not (row.is_mesg or row.is_bkcr):
-          real_credit_courses.add((row.course_id, row.offer_nbr))
+      select relid::int, relname, n_tup_ins, n_tup_upd, n_tup_del
+        from pg_stat_user_tables
+       where relname = any(%s)
+       order by relname
+      """, [_CACHE_TABLES])
+      table_states = cursor.fetchall()
+      cursor.execute('select table_name, update_date from updates order by table_name')
+      cache_key = repr((_CACHE_VERSION, table_states, cursor.fetchall()))
+      digest = hashlib.sha1(cache_key.encode()).hexdigest()[0:12]
+      cache_file = Path(f'./cache/curriculum_{digest}.pickle')
+      if cache_file.exists():
+        try:
+          with open(cache_file, 'rb') as pickle_file:
+            src_courses, metadata, real_credit_courses = pickle.load(pickle_file)
+          print(f'Curriculum info from {cache_file}\t{elapsed(session_start)}')
+        except Exception as err:
+          # Unreadable: fall back to the db, which rewrites the cache.
+          print(f'Ignoring {cache_file}: {err}')
+          cache_file.unlink()
+
+      if not cache_file.exists():
+        # Cache all rule decriptions, previously stored in the cuny_curriculum db.
+        rule_descriptions = dict()
+        cursor.execute("""
+        select rule_key, description
+        from rule_descriptions
+        """)
+        for row in cursor:
+          rule_descriptions[row.rule_key] = row.description
+        print(f'  {len(rule_descriptions):10,} Rule Descriptions\t{elapsed(session_start)}')
+
+        print('Collect Transfer Rules')
+
+        cursor.execute("""
+        select src.course_id, src.offer_nbr, src.discipline, src.catalog_number,
+               rules.source_institution,
+               rules.destination_institution,
+               string_agg(rule_key, ' ') as rules
+        from source_courses src, transfer_rules rules, destination_courses dst
+        where (src.course_id, src.offer_nbr, rules.destination_institution) in
+              (select s.course_id, s.offer_nbr, r.destination_institution
+                 from source_courses s, transfer_rules r, destination_courses d
+                 where s.rule_id = r.id
+                   and d.rule_id = r.id
+                   and (d.is_bkcr or d.is_mesg)
+                 group by s.course_id, s.offer_nbr, r.destination_institution)
+          and src.rule_id = rules.id
+          and dst.rule_id = rules.id
+        group by src.course_id, src.offer_nbr, src.discipline, src.catalog_number,
+                 rules.source_institution, rules.destination_institution
+        """)
+
+        for row in cursor:
+          course_str = f'{row.discipline.strip()} {row.catalog_number.strip()}'
+          src_key = (row.course_id, row.offer_nbr)
+          dest = row.destination_institution
+          rules = tuple((rule_descriptions.get(rule_key, ''), rule_key)
+                        for rule_key in row.rules.split())
+          src_courses[dest][src_key] = SrcCourse._make([row.source_institution,
+                                                        course_str,
+                                                        rules])
+        # Read-only from here on: a plain dict keeps lookups for colleges with no bkcr rules from
+        # adding empty entries.
+        src_courses = dict(src_courses)
+        print(f'  {cursor.rowcount:10,} Sending Courses\t{elapsed(session_start)}')
+
+        # Cache metadata for all cuny courses, and credits for real courses. Note: this info is
+        # used only for receiving courses.
+        meta_start = time.time()
+        metadata = dict()  # Index by (course_id, offer_nbr)
+        real_credit_courses = set()  # Members are (course_id, offer_nbr)
+
+        # COPY streams the rows as plain tuples, without building a row object for each course.
+        with cursor.copy("""
+        copy (select course_id, offer_nbr, institution, discipline, catalog_number,
+                     career ~* '^U' as is_ugrad,
+                     course_status = 'A' as is_active,
+                     designation in ('MNL', 'MLA') as is_mesg,
+                     attributes ~* 'bkcr' as is_bkcr
+              from cuny_courses) to stdout
+        """) as copy:
+          copy.set_types(['int4', 'int4', 'text', 'text', 'text', 'bool', 'bool', 'bool', 'bool'])
+          for (course_id, offer_nbr, institution, discipline, catalog_number,
+               is_ugrad, is_active, is_mesg, is_bkcr) in copy.rows():
+            course_str = f'{discipline.strip()} {catalog_number.strip()}'
+            metadata[(course_id, offer_nbr)] = Metadata(institution,
+                                                        course_str,
+                                                        is_ugrad,
+                                                        is_active,
+                                                        is_mesg,
+                                                        is_bkcr,
+                                                        False)
+            if not (is_mesg or is_bkcr):
+              real_credit_courses.add((course_id, offer_nbr))
+
+        # Written under a temporary name and then renamed, so an interrupted run can't leave a
+        # truncated pickle under a valid name.
+        cache_file.parent.mkdir(exist_ok=True)
+        tmp_file = cache_file.with_suffix('.tmp')
+        with open(tmp_file, 'wb') as pickle_file:
+          pickle.dump((src_courses, metadata, real_credit_courses), pickle_file,
+                      protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_file.replace(cache_file)
+        for stale_file in cache_file.parent.glob('curriculum_*.pickle'):
+          if stale_file != cache_file:
+            stale_file.unlink()
 
       print(f'  {len(real_credit_courses):10,} Real-credit courses', file=report_file)
       print(f'  {len(metadata):10,} All courses\t{elapsed(session_start)}')
@@ -199,8 +264,6 @@ if __name__ == '__main__':
   print(f'\nTransfer Statistics {latest_query.name[0:-4].strip("-0123456789")} '
         f'{time.strftime("%Y-%m-%d", time.localtime(latest_timestamp))}', file=report_file)
 
-  print(f'{len(open(latest_query, errors="replace").readlines()):11,} Transfer records',
-        file=report_file)
   lookup_start = time.time()
 
   # XferCounts
@@ -228,7 +291,7 @@ if __name__ == '__main__':
     return DstCourse._make([0, ''])
 
   def xfer_stats_maker():
-    return XferStats._make((0, set(), 0.0, 0.0, 0.0, defaultdict(dst_course_factory), ''))
+    return XferStats._make((0, set(), 0.0, 0.0, 0.0, defaultdict(dst_course_factory), ()))
 
   def xfer_stats_factory():
     return defaultdict(xfer_stats_maker)
@@ -241,7 +304,8 @@ if __name__ == '__main__':
   with open(latest_query, newline='', errors='replace') as query_file:
     reader = csv.reader(query_file)
     for line in reader:
-      print(f'\r{reader.line_num:,}', end='')
+      if reader.line_num % 1000 == 0:
+        print(f'\r{reader.line_num:,}', end='')
       if reader.line_num == 1:
         Row = namedtuple('Row', [c.lower().replace(' ', '_') for c in line])
       else:
@@ -278,46 +342,41 @@ if __name__ == '__main__':
 
         src_course = (int(row.src_course_id), int(row.src_offer_nbr))
         dst_institution = row.dst_institution
-        dst_course = (int(row.dst_course_id), int(row.dst_offer_nbr))
 
         xfer_counts[dst_institution].total += 1
-        if src_course not in src_courses[dst_institution].keys():
+        src_course_info = src_courses.get(dst_institution, _NO_COURSES).get(src_course)
+        if src_course_info is None:
           # Not a course of interest: no blanket credit rules for this course (although I guess
           # bkcr could be awarded anyway)
           xfer_counts[dst_institution].not_bkcr += 1
           continue
-
-        dst_rule_descriptions = [f'{rule_descriptions[rule_key]}|{rule_key}'
-                                 for rule_key
-                                 in src_courses[dst_institution][src_course].rules]
+        stats = xfer_stats[dst_institution][src_course]
 
         # Log cases where the subject and catalog number don't match current cuny_courses info.
         # -------------------------------------------------------------------------------------
         src_course_str = f'{row.src_subject.strip()} {row.src_catalog_nbr.strip()}'
-        if src_course_str != src_courses[dst_institution][src_course].course_str:
-          print(f'Catalog course str ({src_courses[dst_institution][src_course].course_str}) '
+        if src_course_str != src_course_info.course_str:
+          print(f'Catalog course str ({src_course_info.course_str}) '
                 f'NE src course str ({src_course_str}))', file=log_file)
 
         # For each source course, count the number of times it was transferred, how many different
         # students were involved (in case of re-evaluations), the total number of units taken.
-        xfer_stats[dst_institution][src_course].num_evaluations += 1
-        xfer_stats[dst_institution][src_course].students_set.add(row.student_id)
-        xfer_stats[dst_institution][src_course].units_taken += src_units_taken
+        if stats.num_evaluations == 0:
+          # First transfer of this course: its rules are the same for every later one.
+          stats.rules = src_course_info.rules
+        stats.num_evaluations += 1
+        stats.students_set.add(row.student_id)
+        stats.units_taken += src_units_taken
 
         # Transfer outcomes: what destination course was assigned, and what was its nature?
-        dst_course_id = int(row.dst_course_id)
-        dst_offer_nbr = int(row.dst_offer_nbr)
-        dst_course = (dst_course_id, dst_offer_nbr)
-        dst_discipline = row.dst_subject.strip()
-        dst_catalog_nbr = row.dst_catalog_nbr.strip()
-        dst_course_str = f'{dst_discipline} {dst_catalog_nbr}'
-        try:
-          dst_meta = metadata[dst_course]
-        except KeyError:
+        dst_course = (int(row.dst_course_id), int(row.dst_offer_nbr))
+        dst_course_str = f'{row.dst_subject.strip()} {row.dst_catalog_nbr.strip()}'
+        dst_meta = metadata.get(dst_course)
+        if dst_meta is None:
           # Gotta fake the metadata
           # discipline catalog_number is_ugrad is_active is_mesg is_bkcr, is_unknown
-          dst_meta = Metadata._make([dst_institution, dst_course_str,
-                                     False, False, False, False, True])
+          dst_meta = Metadata(dst_institution, dst_course_str,
+                              False, False, False, False, True)
 
         # Log cases where the subject and catalog number don't match current cuny_courses info.
         # -------------------------------------------------------------------------------------
@@ -332,13 +391,16 @@ if __name__ == '__main__':
                 f'{row.dst_course_id:06}:{row.dst_offer_nbr}',
                 file=log_file)
         if dst_course in real_credit_courses:
-          xfer_stats[dst_institution][src_course].real_credits += dst_units_transferred
+          stats.real_credits += dst_units_transferred
         else:
-          xfer_stats[dst_institution][src_course].bkcr_credits += dst_units_transferred
+          stats.bkcr_credits += dst_units_transferred
 
-        xfer_stats[dst_institution][src_course].courses[dst_course_str].count += 1
-        xfer_stats[dst_institution][src_course].courses[dst_course_str].flags = dst_meta.flags()
-        xfer_stats[dst_institution][src_course].rules = dst_rule_descriptions
+        dst_course_stats = stats.courses[dst_course_str]
+        dst_course_stats.count += 1
+        dst_course_stats.flags = dst_meta.flags()
+    print(f'\r{reader.line_num:,}', end='')
+  # Counted while parsing, rather than by a separate pass over the file.
+  print(f'{reader.line_num:11,} Transfer records', file=report_file)
 
   print(f'{zero_units_taken:11,} Zero-credit sending courses ignored', file=report_file)
   print(f'\nTransfer Statistics took {elapsed(lookup_start)}')
@@ -364,7 +426,9 @@ if __name__ == '__main__':
   print('\nSpreadsheet Summary', file=report_file)
   report_start = time.time()
 
-  wb = Workbook()
+  # Write-only workbook: rows are streamed to disk as they are appended instead of being kept as
+  # editable Cell objects until the save.
+  wb = Workbook(write_only=True)
   # Cell formatting options
   bold = Font(bold=True)
 
@@ -392,73 +456,78 @@ if __name__ == '__main__':
   headings = ['Sending College', 'Sending Course', 'Students', 'Repeats', 'Sending Cr',
               'Real', 'BKCR', '% Real', 'Receiving Courses', 'Rule Descriptions', 'Rule Keys']
 
-  for dst_institution in sorted(xfer_counts.keys()):
+  def styled_cell(ws, value, style):
+    cell = WriteOnlyCell(ws, value)
+    cell.style = style
+    return cell
+
+  # Column widths of a write-only sheet have to be set before its first row is appended, so
+  # create all the sheets first.
+  dst_institutions = sorted(xfer_counts.keys())
+  for dst_institution in dst_institutions:
+    wb.create_sheet(dst_institution[0:3])
+  adjust_widths(wb, [8.0, 10.0, 10.0, 10.0, 10.0, 10.0, 10.0, 10.0, 20.0, 150.0, 20.0])
+
+  for dst_institution, ws in zip(dst_institutions, wb.worksheets):
     print(f'\n{dst_institution[0:3]}', file=log_file)
-    ws = wb.create_sheet(dst_institution[0:3])
-    for col in range(len(headings)):
-      ws.cell(1, col + 1, headings[col]).style = 'center_top'
+    ws.append([styled_cell(ws, heading, 'center_top') for heading in headings])
 
     # Sort dst_institution’s src_course counts
-    institution_dict = {key: xfer_stats[dst_institution][key]
-                        for key in xfer_stats[dst_institution]}
-    row_keys = list(institution_dict.keys())
-    row_keys = sorted(row_keys, key=lambda k: institution_dict[k].num_evaluations, reverse=True)
+    institution_stats = xfer_stats[dst_institution]
+    row_keys = sorted(institution_stats,
+                      key=lambda k: institution_stats[k].num_evaluations, reverse=True)
     ws_row_index = 1
     for row_key in row_keys:
 
       ws_row_index += 1
+      stats = institution_stats[row_key]
       src_meta = metadata[row_key]
-      ws.cell(ws_row_index, 1, src_meta.institution).style = 'left_top'
       if flags_str := src_meta.flags():
         flags_str = f' [{flags_str}]'
-      ws.cell(ws_row_index, 2, f'{src_meta.course_str}{flags_str}').style = 'left_top'
+      src_course_str = f'{src_meta.course_str}{flags_str}'
 
-      num_evaluations = institution_dict[row_key].num_evaluations
-      num_students = len(institution_dict[row_key].students_set)
+      num_evaluations = stats.num_evaluations
+      num_students = len(stats.students_set)
       num_reevaluations = (num_evaluations - num_students)
       assert num_reevaluations >= 0
-      ws.cell(ws_row_index, 3, num_students).style = 'counter_format'
-      ws.cell(ws_row_index, 4, num_reevaluations).style = 'counter_format'
-
-      units_taken = institution_dict[row_key].units_taken / num_evaluations
-      real_credits = institution_dict[row_key].real_credits / num_evaluations
-      bkcr_credits = institution_dict[row_key].bkcr_credits / num_evaluations
-      credits_lost = units_taken - (real_credits + bkcr_credits)
-      percent_real = (100.0 * real_credits) / (real_credits + bkcr_credits + credits_lost)
+
+      units_taken = stats.units_taken / num_evaluations
+      real_credits = stats.real_credits / num_evaluations
+      bkcr_credits = stats.bkcr_credits / num_evaluations
+      percent_real = 100.0 * real_credits / units_taken
       do_highlight = percent_real < 50.0
-      ws.cell(ws_row_index, 5, units_taken).style = 'decimal_format'
-      ws.cell(ws_row_index, 6, real_credits).style = 'decimal_format'
-      ws.cell(ws_row_index, 7, bkcr_credits).style = 'decimal_format'
-      ws.cell(ws_row_index, 8, percent_real).style = 'decimal_format'
 
       courses_list = []
-      for course in institution_dict[row_key].courses:
-        flags_str = institution_dict[row_key].courses[course].flags
+      for course, dst_course in stats.courses.items():
+        flags_str = dst_course.flags
         if flags_str:
           flags_str = f' [{flags_str}]'
-        courses_list.append(f'{course}{flags_str} '
-                            f'({institution_dict[row_key].courses[course].count:,})')
-      ws.cell(ws_row_index, 9, '\n'.join(courses_list)).style = 'left_top'
+        courses_list.append(f'{course}{flags_str} ({dst_course.count:,})')
 
       rule_descriptions = []
       rule_keys = []
-      for rule in institution_dict[row_key].rules:
-        rule_description, rule_key = rule.split('|')
+      for rule_description, rule_key in stats.rules:
         rule_descriptions.append(rule_description)
         rule_keys.append(rule_key)
-      ws.cell(ws_row_index, 10, '\n'.join(rule_descriptions)).style = 'left_top'
-      ws.cell(ws_row_index, 11, '\n'.join(rule_keys)).style = 'left_top'
 
+      cells = [styled_cell(ws, src_meta.institution, 'left_top'),
+               styled_cell(ws, src_course_str, 'left_top'),
+               styled_cell(ws, num_students, 'counter_format'),
+               styled_cell(ws, num_reevaluations, 'counter_format'),
+               styled_cell(ws, units_taken, 'decimal_format'),
+               styled_cell(ws, real_credits, 'decimal_format'),
+               styled_cell(ws, bkcr_credits, 'decimal_format'),
+               styled_cell(ws, percent_real, 'decimal_format'),
+               styled_cell(ws, '\n'.join(courses_list), 'left_top'),
+               styled_cell(ws, '\n'.join(rule_descriptions), 'left_top'),
+               styled_cell(ws, '\n'.join(rule_keys), 'left_top')]
       if do_highlight:
-        for col_index in range(1, len(headings) + 1):
-          ws.cell(ws_row_index, col_index).font = highlighted
+        for cell in cells:
+          cell.font = highlighted
+      ws.append(cells)
     s = '' if ws_row_index == 1 else 's'
     print(f'{dst_institution} {ws_row_index:6,} row{s}', file=report_file)
 
-  # Clean up
-
-  del wb['Sheet']
-  adjust_widths(wb, [8.0, 10.0, 10.0, 10.0, 10.0, 10.0, 10.0, 10.0, 20.0, 150.0, 20.0])
   wb.save(f'./reports/{datetime.today().isoformat()[0:10]}_transfer_statistics.xlsx')
 
   print('\nReport time\t', elapsed(report_start))